@@ -1,5 +1,4 @@
 from pydantic_settings import BaseSettings
-from functools import lru_cache
 
 
 class Settings(BaseSettings):
@@ -13,6 +12,8 @@ class Settings(BaseSettings):
         extra = "ignore"
 
 
-@lru_cache()
+settings = Settings()
+
+
 def get_settings() -> Settings:
-    return Settings()
+    return settings
@@ -93,7 +93,21 @@ RISK_QUESTIONS: List[Dict] = [
 ]
 
 # All questions combined
-ALL_QUESTIONS = SYMPTOM_QUESTIONS + RISK_QUESTIONS
+ALL_QUESTIONS = tuple(SYMPTOM_QUESTIONS + RISK_QUESTIONS)
+
+# Questions are static, so each prompt, option count and score table is
+# built once here instead of on every answer
+_PRECOMPUTED = tuple(
+    (
+        f"📝 คำถามที่ {i + 1}/{len(ALL_QUESTIONS)}\n\n"
+        + q["question"] + "\n\n"
+        + "\n".join(opt["label"] for opt in q["options"])
+        + "\n\nกรุณาตอบเป็นตัวเลขค่ะ",
+        len(q["options"]),
+        tuple(opt["score"] for opt in q["options"]),
+    )
+    for i, q in enumerate(ALL_QUESTIONS)
+)
 
 # Helper to get question by index
 def get_question(index: int) -> Dict:
@@ -103,3 +117,14 @@ def get_question(index: int) -> Dict:
 
 def get_total_questions() -> int:
     return len(ALL_QUESTIONS)
+
+def get_formatted(index: int) -> str:
+    """Get the question prompt with progress and options"""
+    return _PRECOMPUTED[index][0]
+
+def get_option_count(index: int) -> int:
+    return _PRECOMPUTED[index][1]
+
+def get_score(index: int, answer_num: int) -> int:
+    """Get the score of a 1-based answer number"""
+    return _PRECOMPUTED[index][2][answer_num - 1]
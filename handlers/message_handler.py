@@ -1,20 +1,73 @@
 """Message handler for Line chatbot"""
 
-from typing import Optional
+import re
+import sys
+from typing import Dict, Optional, Tuple
 from services.state_manager import get_state_manager, ConversationState
 from services.assessment_service import get_assessment_service
 from services.dust_service import get_dust_service
 
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - optional C extension
+    ahocorasick = None
+
+# Intent names used by the keyword automaton
+INTENT_START = "start"
+INTENT_CANCEL = "cancel"
+INTENT_GREETING = "greeting"
+INTENT_HELP = "help"
+INTENT_CHECK_DUST = "check_dust"
+
+
+def _keywords(*words: str) -> Tuple[str, ...]:
+    """Lowercase and intern keywords once, matching the lowercased message text"""
+    return tuple(sys.intern(word.lower()) for word in words)
+
+
+def _build_keyword_automaton(intent_keywords: Dict[str, Tuple[str, ...]]):
+    """Compile all intent keywords into one Aho-Corasick automaton"""
+    if ahocorasick is None:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for intent, keywords in intent_keywords.items():
+        for kw in keywords:
+            automaton.add_word(kw, (intent, kw))
+    automaton.make_automaton()
+    return automaton
+
 
 class MessageHandler:
     """Handles incoming Line messages"""
 
     # Keywords for different intents (be specific to avoid matching FAQ queries)
-    START_KEYWORDS = ["ประเมินอาการ", "เริ่มประเมิน", "ตรวจอาการ", "start", "assess", "วินิจฉัย"]
-    CANCEL_KEYWORDS = ["ยกเลิก", "cancel", "หยุด", "เลิก", "ออก"]
-    GREETING_KEYWORDS = ["สวัสดี", "hello", "hi", "หวัดดี", "ดีครับ", "ดีค่ะ"]
-    HELP_KEYWORDS = ["help", "ช่วย", "วิธี", "ใช้งาน", "menu", "เมนู"]
-    CHECK_DUST_KEYWORDS = ["ตรวจสอบค่าฝุ่น", "เช็คค่าฝุ่น", "ค่าฝุ่นวันนี้", "ดูค่าฝุ่น", "pm2.5 วันนี้", "ค่าฝุ่นตอนนี้", "aqi"]
+    START_KEYWORDS = _keywords("ประเมินอาการ", "เริ่มประเมิน", "ตรวจอาการ", "start", "assess", "วินิจฉัย")
+    CANCEL_KEYWORDS = _keywords("ยกเลิก", "cancel", "หยุด", "เลิก", "ออก")
+    GREETING_KEYWORDS = _keywords("สวัสดี", "hello", "hi", "หวัดดี", "ดีครับ", "ดีค่ะ")
+    HELP_KEYWORDS = _keywords("help", "ช่วย", "วิธี", "ใช้งาน", "menu", "เมนู")
+    CHECK_DUST_KEYWORDS = _keywords("ตรวจสอบค่าฝุ่น", "เช็คค่าฝุ่น", "ค่าฝุ่นวันนี้", "ดูค่าฝุ่น", "pm2.5 วันนี้", "ค่าฝุ่นตอนนี้", "aqi")
+
+    INTENT_KEYWORDS = {
+        INTENT_START: START_KEYWORDS,
+        INTENT_CANCEL: CANCEL_KEYWORDS,
+        INTENT_GREETING: GREETING_KEYWORDS,
+        INTENT_HELP: HELP_KEYWORDS,
+        INTENT_CHECK_DUST: CHECK_DUST_KEYWORDS,
+    }
+
+    # Intents checked during an active flow and while idle, highest priority first
+    ACTIVE_INTENTS = (INTENT_CANCEL,)
+    IDLE_INTENTS = (INTENT_GREETING, INTENT_HELP, INTENT_CHECK_DUST, INTENT_START)
+
+    # One linear pass over the message finds every keyword at once
+    _KEYWORD_AUTOMATON = _build_keyword_automaton(INTENT_KEYWORDS)
+
+    # Per-intent alternation patterns, used when pyahocorasick is missing
+    _KEYWORD_PATTERNS = {
+        intent: re.compile("|".join(map(re.escape, keywords)))
+        for intent, keywords in INTENT_KEYWORDS.items()
+    }
 
     def __init__(self):
         self.state_manager = get_state_manager()
@@ -26,9 +79,15 @@ class MessageHandler:
         text_lower = text.lower().strip()
         session = self.state_manager.get_session(user_id)
 
+        # Fast path: a purely numeric reply during assessment is an answer
+        # and cannot contain a cancel keyword, so skip the keyword scan
+        if session.state == ConversationState.ASSESSMENT and text_lower.isdigit():
+            response, is_complete = self.assessment_service.process_answer(user_id, text)
+            return response or self._get_default_message()
+
         # Check for cancel during assessment or awaiting location
         if session.state in [ConversationState.ASSESSMENT, ConversationState.AWAITING_LOCATION]:
-            if self._matches_keywords(text_lower, self.CANCEL_KEYWORDS):
+            if self._match_intent(text_lower, self.ACTIVE_INTENTS) == INTENT_CANCEL:
                 if session.state == ConversationState.ASSESSMENT:
                     return self.assessment_service.cancel_assessment(user_id)
                 else:
@@ -47,22 +106,24 @@ class MessageHandler:
         if session.state == ConversationState.AWAITING_LOCATION:
             return self._get_location_request_message()
 
+        intent = self._match_intent(text_lower, self.IDLE_INTENTS)
+
         # Check for greetings
-        if self._matches_keywords(text_lower, self.GREETING_KEYWORDS):
+        if intent == INTENT_GREETING:
             return self._get_welcome_message()
 
         # Check for help
-        if self._matches_keywords(text_lower, self.HELP_KEYWORDS):
+        if intent == INTENT_HELP:
             return self._get_help_message()
 
         # Check for dust level check - ask for location
-        if self._matches_keywords(text_lower, self.CHECK_DUST_KEYWORDS):
+        if intent == INTENT_CHECK_DUST:
             session.state = ConversationState.AWAITING_LOCATION
             self.state_manager.update_session(session)
             return self._get_location_request_message()
 
         # Check for start assessment
-        if self._matches_keywords(text_lower, self.START_KEYWORDS):
+        if intent == INTENT_START:
             return self.assessment_service.start_assessment(user_id)
 
         # Try to answer from FAQ knowledge base
@@ -73,9 +134,27 @@ class MessageHandler:
         # Default response
         return self._get_default_message()
 
-    def _matches_keywords(self, text: str, keywords: list) -> bool:
-        """Check if text contains any keyword"""
-        return any(kw in text for kw in keywords)
+    @classmethod
+    def _match_intent(cls, text: str, candidates: Tuple[str, ...]) -> Optional[str]:
+        """Return the highest-priority candidate intent found in text"""
+        if cls._KEYWORD_AUTOMATON is not None:
+            best = None
+            for _, (intent, _) in cls._KEYWORD_AUTOMATON.iter(text):
+                if intent not in candidates:
+                    continue
+                rank = candidates.index(intent)
+                if best is None or rank < best:
+                    best = rank
+                    if rank == 0:
+                        # Nothing can outrank the first candidate, stop scanning
+                        break
+            return candidates[best] if best is not None else None
+
+        # Fallback when pyahocorasick is not installed
+        for intent in candidates:
+            if cls._KEYWORD_PATTERNS[intent].search(text) is not None:
+                return intent
+        return None
 
     def _get_welcome_message(self) -> str:
         """Get welcome message"""
@@ -150,14 +229,3 @@ class MessageHandler:
         # Get dust report for the location
         return await self.dust_service.get_dust_report_by_location(latitude, longitude)
 
-
-# Singleton instance
-_message_handler: Optional[MessageHandler] = None
-
-
-def get_message_handler() -> MessageHandler:
-    """Get singleton message handler"""
-    global _message_handler
-    if _message_handler is None:
-        _message_handler = MessageHandler()
-    return _message_handler
@@ -5,8 +5,9 @@ Line Messaging API webhook server
 
 import logging
 from contextlib import asynccontextmanager
+from typing import Dict
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from linebot.v3 import WebhookHandler
 from linebot.v3.messaging import (
     Configuration,
@@ -19,9 +20,11 @@ from linebot.v3.webhooks import MessageEvent, TextMessageContent, LocationMessag
 from linebot.v3.exceptions import InvalidSignatureError
 
 from config import get_settings
-from handlers.message_handler import get_message_handler
+from handlers.message_handler import MessageHandler
 from services.scheduler_service import get_scheduler_service
-from services.broadcast_service import get_broadcast_service
+from services.broadcast_service import BroadcastService, get_broadcast_service
+from services.dust_service import get_dust_service
+from services.state_manager import get_state_manager
 
 # Setup logging
 logging.basicConfig(
@@ -57,6 +60,10 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Health Assessment Chatbot...")
     _ensure_line_initialized()
 
+    # Long-lived services, injected into endpoints via Depends
+    app.state.message_handler = MessageHandler()
+    app.state.broadcast_service = get_broadcast_service()
+
     # Start scheduler for periodic broadcasts
     scheduler = get_scheduler_service()
     scheduler.start()
@@ -67,6 +74,9 @@ async def lifespan(app: FastAPI):
 
     logger.info("Shutting down...")
     scheduler.stop()
+    await app.state.broadcast_service.close()
+    await get_dust_service().close()
+    get_state_manager().close()
     if _api_client:
         await _api_client.close()
 
@@ -79,34 +89,55 @@ app = FastAPI(
 )
 
 
+async def get_message_handler(request: Request) -> MessageHandler:
+    """Dependency returning the message handler created in lifespan"""
+    return request.app.state.message_handler
+
+
+async def get_broadcaster(request: Request) -> BroadcastService:
+    """Dependency returning the broadcast service created in lifespan"""
+    return request.app.state.broadcast_service
+
+
 @app.get("/")
-async def root():
+async def root() -> Dict[str, str]:
     """Health check endpoint"""
     return {"status": "ok", "message": "Health Assessment Chatbot is running"}
 
 
 @app.post("/broadcast")
-async def manual_broadcast():
-    """Manually trigger PM2.5 broadcast (for testing)"""
+async def manual_broadcast(
+    refresh: bool = False,
+    service: BroadcastService = Depends(get_broadcaster),
+) -> Dict[str, str]:
+    """Manually trigger PM2.5 broadcast (for testing)
+
+    Pass ?refresh=true to ignore the cached image URL and scrape again.
+    """
     logger.info("Manual broadcast triggered")
-    service = get_broadcast_service()
+    if refresh:
+        service.invalidate_cache()
     success = await service.broadcast_pm25_report()
     return {"status": "ok" if success else "failed", "message": "Broadcast sent" if success else "Broadcast failed"}
 
 
 @app.post("/webhook")
-async def webhook(request: Request):
+async def webhook(
+    request: Request,
+    handler: MessageHandler = Depends(get_message_handler),
+) -> Dict[str, str]:
     """Line webhook endpoint"""
     _ensure_line_initialized()
 
     signature = request.headers.get("X-Line-Signature", "")
     body = await request.body()
-    body_text = body.decode("utf-8")
 
-    logger.info(f"Received webhook request")
+    logger.info("Received webhook request")
 
     try:
-        events = _line_handler.parser.parse(body_text, signature)
+        # WebhookParser signs body.encode("utf-8") internally, so it needs
+        # text; decode exactly once here
+        events = _line_handler.parser.parse(body.decode("utf-8"), signature)
     except InvalidSignatureError:
         logger.error("Invalid signature")
         raise HTTPException(status_code=400, detail="Invalid signature")
@@ -114,26 +145,25 @@ async def webhook(request: Request):
     for event in events:
         if isinstance(event, MessageEvent):
             if isinstance(event.message, TextMessageContent):
-                await handle_text_message(event)
+                await handle_text_message(event, handler)
             elif isinstance(event.message, LocationMessageContent):
-                await handle_location_message(event)
+                await handle_location_message(event, handler)
 
     return {"status": "ok"}
 
 
-async def handle_text_message(event: MessageEvent):
+async def handle_text_message(event: MessageEvent, handler: MessageHandler):
     """Handle incoming text messages"""
     user_id = event.source.user_id
     text = event.message.text
     reply_token = event.reply_token
 
-    logger.info(f"User [{user_id[:8]}...]: {text}")
+    logger.info("User [%.8s...]: %s", user_id, text)
 
     # Get response from message handler
-    handler = get_message_handler()
     response = await handler.handle_message(user_id, text)
 
-    logger.info(f"Bot response: {response[:50]}...")
+    logger.info("Bot response: %.50s...", response)
 
     # Send reply
     try:
@@ -144,23 +174,22 @@ async def handle_text_message(event: MessageEvent):
             )
         )
     except Exception as e:
-        logger.error(f"Error sending reply: {e}")
+        logger.error("Error sending reply: %s", e)
 
 
-async def handle_location_message(event: MessageEvent):
+async def handle_location_message(event: MessageEvent, handler: MessageHandler):
     """Handle incoming location messages"""
     user_id = event.source.user_id
     latitude = event.message.latitude
     longitude = event.message.longitude
     reply_token = event.reply_token
 
-    logger.info(f"User [{user_id[:8]}...]: Location ({latitude}, {longitude})")
+    logger.info("User [%.8s...]: Location (%s, %s)", user_id, latitude, longitude)
 
     # Get response from message handler
-    handler = get_message_handler()
     response = await handler.handle_location(user_id, latitude, longitude)
 
-    logger.info(f"Bot response: {response[:50]}...")
+    logger.info("Bot response: %.50s...", response)
 
     # Send reply
     try:
@@ -171,9 +200,10 @@ async def handle_location_message(event: MessageEvent):
             )
         )
     except Exception as e:
-        logger.error(f"Error sending reply: {e}")
+        logger.error("Error sending reply: %s", e)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8765)
+    # "auto" selects uvloop when it is installed (it is not available on Windows)
+    uvicorn.run(app, host="0.0.0.0", port=8765, loop="auto", http="httptools")
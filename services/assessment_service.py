@@ -1,7 +1,14 @@
 """Assessment service for health scoring and recommendations"""
 
 from typing import Dict, Optional, Tuple
-from data.questions import ALL_QUESTIONS, get_question, get_total_questions
+from data.questions import (
+    ALL_QUESTIONS,
+    get_question,
+    get_total_questions,
+    get_formatted,
+    get_option_count,
+    get_score,
+)
 from data.recommendations import get_recommendation
 from data.faq import find_faq, get_faq_list, get_faq_by_number
 from services.state_manager import (
@@ -14,6 +21,12 @@ from services.state_manager import (
 class AssessmentService:
     """Service for managing health assessments"""
 
+    # Accepted answer digits (ASCII and Thai), zero is never a valid option
+    _DIGIT_VALUES = {
+        **{str(n): n for n in range(1, 10)},
+        **{chr(0x0E50 + n): n for n in range(1, 10)},
+    }
+
     def __init__(self):
         self.state_manager = get_state_manager()
 
@@ -30,15 +43,9 @@ class AssessmentService:
 
     def _format_question(self, index: int) -> str:
         """Format question with options"""
-        question = get_question(index)
-        if not question:
+        if not 0 <= index < get_total_questions():
             return None
-
-        progress = f"📝 คำถามที่ {index + 1}/{get_total_questions()}\n\n"
-        q_text = question["question"] + "\n\n"
-        options = "\n".join([opt["label"] for opt in question["options"]])
-
-        return progress + q_text + options + "\n\nกรุณาตอบเป็นตัวเลขค่ะ"
+        return get_formatted(index)
 
     def process_answer(self, user_id: str, answer: str) -> Tuple[str, bool]:
         """
@@ -50,21 +57,22 @@ class AssessmentService:
         if session.state != ConversationState.ASSESSMENT:
             return None, False
 
-        question = get_question(session.current_question_index)
+        index = session.current_question_index
+        question = get_question(index)
         if not question:
             return self._complete_assessment(user_id), True
 
         # Parse answer (expect number 1, 2, 3, etc.)
-        answer_num = self._parse_answer(answer, len(question["options"]))
+        option_count = get_option_count(index)
+        answer_num = self._parse_answer(answer, option_count)
         if answer_num is None:
-            return f"กรุณาตอบเป็นตัวเลข 1-{len(question['options'])} ค่ะ", False
+            return f"กรุณาตอบเป็นตัวเลข 1-{option_count} ค่ะ", False
 
         # Record answer
-        selected_option = question["options"][answer_num - 1]
         self.state_manager.add_answer(
             user_id,
             question["id"],
-            selected_option["score"]
+            get_score(index, answer_num)
         )
 
         # Move to next question
@@ -85,10 +93,9 @@ class AssessmentService:
 
         # Try to extract number
         for char in answer:
-            if char.isdigit():
-                num = int(char)
-                if 1 <= num <= max_options:
-                    return num
+            num = self._DIGIT_VALUES.get(char)
+            if num is not None and num <= max_options:
+                return num
         return None
 
     def _complete_assessment(self, user_id: str) -> str:
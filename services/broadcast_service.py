@@ -2,14 +2,87 @@
 
 import httpx
 import logging
+import orjson
 import asyncio
+import html as html_lib
+import re
+import time
 from typing import Optional, List
+from selectolax.lexbor import LexborHTMLParser
 
 logger = logging.getLogger(__name__)
 
 # Google Sites page with PM2.5 image
 PM25_IMAGE_PAGE = "https://sites.google.com/view/pm25plk/home"
 
+# Section holding the PM2.5 report image, and the image element inside it
+PM25_SECTION_ID = "h.7f0feb644f138bc2_0"
+PM25_SECTION_SELECTOR = f'section[id="{PM25_SECTION_ID}"]'
+PM25_IMAGE_CLASS = "CENy8b"
+PM25_IMAGE_SELECTOR = f"img.{PM25_IMAGE_CLASS}"
+
+# Raw <img> tags and their src and class attributes, for the regex fast path
+_IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_SRC_ATTR_RE = re.compile(r'(?<![\w-])src="([^"]+)"', re.IGNORECASE)
+_CLASS_ATTR_RE = re.compile(r'(?<![\w-])class="([^"]*)"', re.IGNORECASE)
+
+# How long a scraped image URL is reused before scraping again; broadcasts
+# within the same 15-minute slot share one scrape
+IMAGE_URL_CACHE_SECONDS = 900
+
+# LINE accepts at most this many messages per broadcast request
+MAX_BROADCAST_MESSAGES = 5
+
+
+def _image_message(image_url: str) -> dict:
+    return {
+        "type": "image",
+        "originalContentUrl": image_url,
+        "previewImageUrl": image_url
+    }
+
+
+def _text_message(text: str) -> dict:
+    return {
+        "type": "text",
+        "text": text
+    }
+
+
+def _extract_static_image_url(html: str) -> Optional[str]:
+    """Find the PM2.5 image src in the target section of the page HTML"""
+    # Only the target section is trusted here; picking the portrait image
+    # among the others needs layout info, which only the browser has
+    marker = html.find(f'id="{PM25_SECTION_ID}"')
+    if marker == -1:
+        return None
+
+    # Parse from the section's opening tag onwards, skipping the page head,
+    # inline scripts and every section before it
+    start = html.rfind("<section", 0, marker)
+    if start == -1:
+        return None
+
+    # Fast path: scan the raw tags up to the next section for the image,
+    # without building a DOM
+    end = html.find("<section", marker)
+    for tag in _IMG_TAG_RE.finditer(html, start, end if end != -1 else len(html)):
+        # Match the class token exactly, as the img.CENy8b selector does
+        cls = _CLASS_ATTR_RE.search(tag.group(0))
+        if cls is None or PM25_IMAGE_CLASS not in cls.group(1).split():
+            continue
+        match = _SRC_ATTR_RE.search(tag.group(0))
+        if match and "lh3.googleusercontent.com" in match.group(1):
+            return html_lib.unescape(match.group(1))
+
+    section = LexborHTMLParser(html[start:]).css_first(PM25_SECTION_SELECTOR)
+    if section:
+        img = section.css_first(PM25_IMAGE_SELECTOR)
+        src = img.attributes.get("src") if img else None
+        if src and "lh3.googleusercontent.com" in src:
+            return src
+    return None
+
 
 class BroadcastService:
     """Service for broadcasting messages to Line followers"""
@@ -21,34 +94,116 @@ class BroadcastService:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {channel_access_token}"
         }
+        # Shared client so broadcasts reuse the pooled connection to api.line.me
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+            http2=True,
+            headers=self.headers,
+        )
+        # Separate client for scraping so the LINE token is never sent to Google
+        self._page_client = httpx.AsyncClient(timeout=10.0, http2=True, follow_redirects=True)
+        self._cached_url: Optional[str] = None
+        self._cached_at: float = 0.0
+        # Playwright browser, launched on first fallback and kept for reuse
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = asyncio.Lock()
+        self._pending_closes: set = set()
+
+    async def close(self):
+        """Close the shared HTTP clients and the headless browser"""
+        await self._client.aclose()
+        await self._page_client.aclose()
+        if self._pending_closes:
+            await asyncio.gather(*self._pending_closes, return_exceptions=True)
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def invalidate_cache(self):
+        """Forget the cached PM2.5 image URL so the next call scrapes again"""
+        self._cached_url = None
+        self._cached_at = 0.0
 
     async def get_pm25_image_url(self) -> Optional[str]:
-        """Get PM2.5 image URL from Google Sites using Playwright (headless browser)"""
+        """Get PM2.5 image URL, reusing a recently scraped one when available"""
+        if self._cached_url and time.monotonic() - self._cached_at < IMAGE_URL_CACHE_SECONDS:
+            logger.info("Using cached PM2.5 image URL")
+            return self._cached_url
+
+        src = await self._scrape_pm25_image_url()
+        if src:
+            self._cached_url = src
+            self._cached_at = time.monotonic()
+        return src
+
+    async def _scrape_pm25_image_url(self) -> Optional[str]:
+        """Get PM2.5 image URL, trying the static HTML before a headless browser"""
+        src = await self._fetch_static_image_url()
+        if src:
+            return src
+
+        logger.info("PM2.5 image not found in static HTML, falling back to headless browser")
+        return await self._render_pm25_image_url()
+
+    async def _fetch_static_image_url(self) -> Optional[str]:
+        """Get PM2.5 image URL from the server-rendered Google Sites HTML"""
         try:
-            from playwright.async_api import async_playwright
+            response = await self._page_client.get(PM25_IMAGE_PAGE)
+            if response.status_code != 200:
+                logger.warning("Fetching PM2.5 page failed: %s", response.status_code)
+                return None
+            html = response.text
+        except Exception as e:
+            logger.error("Error fetching PM2.5 page: %s", e)
+            return None
+
+        # Parsing the full page is CPU work; keep it off the event loop so
+        # webhooks are still served during a scheduled broadcast
+        src = await asyncio.to_thread(_extract_static_image_url, html)
+        if src:
+            logger.info("Found PM2.5 image in static HTML: %.80s...", src)
+        return src
+
+    async def _get_browser(self):
+        """Launch the headless browser on first use and keep it for later calls"""
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+        return self._browser
 
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                page = await browser.new_page()
+    async def _render_pm25_image_url(self) -> Optional[str]:
+        """Get PM2.5 image URL from Google Sites using Playwright (headless browser)"""
+        try:
+            browser = await self._get_browser()
+            context = await browser.new_context()
+            try:
+                page = await context.new_page()
 
                 await page.goto(PM25_IMAGE_PAGE, wait_until="networkidle")
 
                 # Wait for images to load
-                await page.wait_for_selector("img.CENy8b", timeout=10000)
+                await page.wait_for_selector(PM25_IMAGE_SELECTOR, timeout=10000)
 
                 # Try to find image in specific section first (PM2.5 report section)
-                section = await page.query_selector("section#h\\.7f0feb644f138bc2_0")
+                section = await page.query_selector(PM25_SECTION_SELECTOR)
                 if section:
-                    img = await section.query_selector("img.CENy8b")
+                    img = await section.query_selector(PM25_IMAGE_SELECTOR)
                     if img:
                         src = await img.get_attribute("src")
                         if src and "lh3.googleusercontent.com" in src:
-                            logger.info(f"Found PM2.5 image in target section: {src[:80]}...")
-                            await browser.close()
+                            logger.info("Found PM2.5 image in target section: %.80s...", src)
                             return src
 
                 # Fallback: find first portrait image
-                images = await page.query_selector_all("img.CENy8b")
+                images = await page.query_selector_all(PM25_IMAGE_SELECTOR)
                 for img in images:
                     src = await img.get_attribute("src")
                     if not src or "lh3.googleusercontent.com/sitesv" not in src:
@@ -58,93 +213,74 @@ class BroadcastService:
                     if box:
                         height = box.get("height", 0)
                         width = box.get("width", 0)
-                        logger.info(f"Found image: {width:.0f}x{height:.0f} - {src[:60]}...")
+                        logger.info("Found image: %.0fx%.0f - %.60s...", width, height, src)
 
                         # First portrait image with reasonable size
                         if height > width and height > 300:
-                            logger.info(f"Selected first portrait image: {src[:80]}...")
-                            await browser.close()
+                            logger.info("Selected first portrait image: %.80s...", src)
                             return src
 
-                await browser.close()
                 logger.warning("No suitable PM2.5 image found on page")
                 return None
+            finally:
+                # Tear the context down in the background so the caller can
+                # start broadcasting without waiting for the page to close
+                task = asyncio.create_task(context.close())
+                self._pending_closes.add(task)
+                task.add_done_callback(self._pending_closes.discard)
 
         except Exception as e:
-            logger.error(f"Error getting PM2.5 image: {e}")
+            logger.error("Error getting PM2.5 image: %s", e)
             return None
 
-    async def broadcast_image(self, image_url: str, alt_text: str = "รายงานค่าฝุ่น PM2.5") -> bool:
-        """Broadcast image to all followers"""
+    async def broadcast(self, messages: List[dict]) -> bool:
+        """Broadcast up to MAX_BROADCAST_MESSAGES messages in one request"""
+        if not messages or len(messages) > MAX_BROADCAST_MESSAGES:
+            logger.error("Broadcast needs 1-%d messages, got %d", MAX_BROADCAST_MESSAGES, len(messages))
+            return False
+
+        return await self._broadcast_raw(orjson.dumps({"messages": messages}), len(messages))
+
+    async def _broadcast_raw(self, body: bytes, message_count: int = 1) -> bool:
+        """Post an already serialized broadcast payload"""
         try:
-            payload = {
-                "messages": [
-                    {
-                        "type": "image",
-                        "originalContentUrl": image_url,
-                        "previewImageUrl": image_url
-                    }
-                ]
-            }
-
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    self.broadcast_url,
-                    headers=self.headers,
-                    json=payload
-                )
-
-                if response.status_code == 200:
-                    logger.info("Broadcast image sent successfully")
-                    return True
-                else:
-                    logger.error(f"Broadcast failed: {response.status_code} - {response.text}")
-                    return False
+            response = await self._client.post(self.broadcast_url, content=body)
+
+            if response.status_code == 200:
+                logger.info("Broadcast sent successfully (%d messages)", message_count)
+                return True
+            else:
+                logger.error("Broadcast failed: %s - %s", response.status_code, response.text)
+                return False
 
         except Exception as e:
-            logger.error(f"Error broadcasting image: {e}")
+            logger.error("Error broadcasting: %s", e)
             return False
 
+    async def broadcast_image(self, image_url: str, alt_text: str = "รายงานค่าฝุ่น PM2.5") -> bool:
+        """Broadcast image to all followers"""
+        return await self.broadcast([_image_message(image_url)])
+
     async def broadcast_text(self, message: str) -> bool:
         """Broadcast text message to all followers"""
-        try:
-            payload = {
-                "messages": [
-                    {
-                        "type": "text",
-                        "text": message
-                    }
-                ]
-            }
-
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    self.broadcast_url,
-                    headers=self.headers,
-                    json=payload
-                )
-
-                if response.status_code == 200:
-                    logger.info("Broadcast text sent successfully")
-                    return True
-                else:
-                    logger.error(f"Broadcast failed: {response.status_code} - {response.text}")
-                    return False
+        return await self.broadcast([_text_message(message)])
 
-        except Exception as e:
-            logger.error(f"Error broadcasting text: {e}")
-            return False
+    async def broadcast_pm25_report(self, caption: Optional[str] = None) -> bool:
+        """Fetch PM2.5 image and broadcast to all followers
 
-    async def broadcast_pm25_report(self) -> bool:
-        """Fetch PM2.5 image and broadcast to all followers (image only)"""
+        The image is sent alone unless a caption is given, in which case
+        both go out in the same broadcast request.
+        """
         image_url = await self.get_pm25_image_url()
 
         if not image_url:
             logger.error("Could not get PM2.5 image URL")
             return False
 
-        # Send image only
-        return await self.broadcast_image(image_url)
+        messages = [_image_message(image_url)]
+        if caption:
+            messages.append(_text_message(caption))
+        return await self.broadcast(messages)
 
 
 # Singleton instance
@@ -1,11 +1,20 @@
 """Dust/Air Quality Service - fetches PM2.5 data from Air4Thai API"""
 
+import asyncio
+import bisect
 import httpx
 import logging
 import math
+import numpy as np
+import orjson
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - optional JIT compiler
+    njit = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,13 +28,58 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     delta_lon = math.radians(lon2 - lon1)
 
     a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    c = 2 * math.asin(math.sqrt(a))
 
     return R * c
 
+
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized haversine distance in kilometers from one point to many"""
+    R = 6371  # Earth's radius in kilometers
+
+    lat_rad = np.radians(lat)
+    lats_rad = np.radians(lats)
+    delta_lat = lats_rad - lat_rad
+    delta_lon = np.radians(lons - lon)
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat_rad) * np.cos(lats_rad) * np.sin(delta_lon / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def _nearest_station_kernel(lat, lng, lats, lngs, valid):
+    """Index and distance of the nearest valid station in one pass, (-1, inf) if none"""
+    R = 6371.0
+    lat_rad = np.radians(lat)
+    cos_lat = np.cos(lat_rad)
+    best_i = -1
+    best_d = np.inf
+    for i in range(lats.shape[0]):
+        if not valid[i]:
+            continue
+        lat2_rad = np.radians(lats[i])
+        a = np.sin((lat2_rad - lat_rad) / 2) ** 2 + cos_lat * np.cos(lat2_rad) * np.sin(np.radians(lngs[i] - lng) / 2) ** 2
+        d = 2 * R * np.arcsin(np.sqrt(a))
+        if d < best_d:
+            best_i = i
+            best_d = d
+    return best_i, best_d
+
+
+# Compiled at import when numba (requirements-optional.txt) is installed, so no
+# request pays the JIT cost; the explicit signature makes compilation eager and
+# the result is cached on disk. It replaces the bounding-box prefilter with a
+# single pass. Without numba get_nearest_station uses the vectorized NumPy path
+_NEAREST_NB_SIGNATURE = "Tuple((int64, float64))(float64, float64, float64[:], float64[:], boolean[:])"
+_nearest_nb = (
+    njit(_NEAREST_NB_SIGNATURE, cache=True)(_nearest_station_kernel) if njit is not None else None
+)
+
 # Air4Thai API endpoint
 AIR4THAI_API_URL = "http://air4thai.pcd.go.th/forappV2/getAQI_JSON.php"
 
+# Half-width in degrees of the box searched before falling back to every station
+NEAREST_SEARCH_BAND = 1.5
+
 # AQI level descriptions based on Thai standard (Air4Thai / กรมควบคุมมลพิษ)
 AQI_LEVELS = [
     {"max": 15.0, "level": "ดีมาก", "color": "🔵", "advice": "คุณภาพอากาศดีมาก ประชาชนทุกคนสามารถดำเนินชีวิตได้ตามปกติ"},
@@ -35,38 +89,151 @@ AQI_LEVELS = [
     {"max": 999, "level": "มีผลกระทบต่อสุขภาพ", "color": "🔴", "advice": "งดกิจกรรมกลางแจ้ง ถ้าจำเป็นต้องออกข้างนอกควรสวมหน้ากากป้องกันฝุ่น PM2.5 หากมีอาการผิดปกติให้รีบไปพบแพทย์ ผู้มีโรคประจำตัวควรอยู่ในพื้นที่ปลอดภัยและเตรียมยาให้พร้อม"},
 ]
 
+# Upper bound of each AQI level, for binary search in get_aqi_level
+_AQI_MAXES = tuple(level["max"] for level in AQI_LEVELS)
+
+# AQI_LEVELS as parallel arrays, for classifying many readings at once
+_AQI_MAXES_NP = np.array(_AQI_MAXES, dtype=np.float64)
+_AQI_LEVEL_NAMES = np.array([level["level"] for level in AQI_LEVELS], dtype=object)
+_AQI_COLORS = np.array([level["color"] for level in AQI_LEVELS], dtype=object)
+_AQI_ADVICE = np.array([level["advice"] for level in AQI_LEVELS], dtype=object)
+
+
+def get_aqi_levels_batch(pm25_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Classify many PM2.5 values at once, returning (levels, colors, advice) arrays"""
+    idx = np.searchsorted(_AQI_MAXES_NP, pm25_values, side="left")
+    idx = np.minimum(idx, len(AQI_LEVELS) - 1)
+    return _AQI_LEVEL_NAMES[idx], _AQI_COLORS[idx], _AQI_ADVICE[idx]
+
+
 # Bangkok area stations (most commonly requested)
-BANGKOK_STATIONS = ["02t", "03t", "05t", "10t", "11t", "12t", "50t", "52t", "53t", "54t", "59t", "61t"]
+BANGKOK_STATIONS = frozenset(["02t", "03t", "05t", "10t", "11t", "12t", "50t", "52t", "53t", "54t", "59t", "61t"])
 
 
 class DustService:
     """Service for fetching air quality data"""
 
     def __init__(self):
-        self.cached_data: Optional[Dict] = None
+        self.cached_data: Optional[List[Dict]] = None
         self.cache_time: Optional[datetime] = None
         self.cache_duration = 600  # 10 minutes cache
+        logger.info(
+            "Nearest-station search: %s",
+            "numba kernel" if _nearest_nb is not None else "NumPy with bounding-box prefilter",
+        )
+        if _nearest_nb is not None:
+            # Pay the dispatcher's first-call setup here rather than on the
+            # first location webhook
+            _nearest_nb(0.0, 0.0, np.zeros(1), np.zeros(1), np.ones(1, dtype=bool))
+        # Lets concurrent lookups share a single Air4Thai fetch
+        self._fetch_lock = asyncio.Lock()
+        # (stations, lat, lng, valid) for the last fetched station list
+        self._station_arrays: Optional[Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]] = None
+        # (haystack, start offsets, lookup results) for name search
+        self._name_index: Tuple[str, List[int], List[Dict]] = ("", [], [])
+        self._bangkok_summary: Optional[Dict] = None
+        # Shared client so repeated lookups reuse the connection to Air4Thai.
+        # The API is plain HTTP, so HTTP/2 (which needs TLS) does not apply
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+        )
+
+    async def close(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
+
+    def _is_cache_fresh(self) -> bool:
+        """Check whether the cached station list is still within cache_duration"""
+        return (
+            self.cache_time is not None
+            and (datetime.now() - self.cache_time).total_seconds() < self.cache_duration
+        )
 
     async def get_all_stations(self) -> Optional[List[Dict]]:
+        """Get all station data, fetching from Air4Thai when the cache is stale"""
+        if self._is_cache_fresh():
+            return self.cached_data
+
+        async with self._fetch_lock:
+            # Another task may have refreshed the cache while we waited
+            if self._is_cache_fresh():
+                return self.cached_data
+
+            stations = await self._fetch_stations()
+            if stations is not None:
+                self._station_arrays = self._build_station_arrays(stations)
+                self._name_index = self._build_name_index(stations)
+                self._bangkok_summary = self._build_bangkok_summary(stations)
+                self.cached_data = stations
+                self.cache_time = datetime.now()
+            return stations
+
+    async def _fetch_stations(self) -> Optional[List[Dict]]:
         """Fetch all station data from Air4Thai API"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(AIR4THAI_API_URL)
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("stations", [])
+            response = await self._client.get(AIR4THAI_API_URL)
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                return data.get("stations", [])
         except Exception as e:
             logger.error(f"Error fetching Air4Thai data: {e}")
         return None
 
-    async def get_bangkok_average(self) -> Optional[Dict]:
-        """Get average PM2.5 for Bangkok area"""
-        stations = await self.get_all_stations()
-        if not stations:
-            return None
+    def _build_station_arrays(self, stations: List[Dict]) -> Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]:
+        """Parse station coordinates once into arrays for vectorized lookups"""
+        n = len(stations)
+        lats = np.zeros(n, dtype=np.float64)
+        lngs = np.zeros(n, dtype=np.float64)
+        valid = np.zeros(n, dtype=bool)
+
+        for i, station in enumerate(stations):
+            try:
+                lats[i] = float(station.get("lat", 0))
+                lngs[i] = float(station.get("long", 0))
+            except (ValueError, TypeError):
+                continue
+
+            # Station needs coordinates and a PM2.5 reading
+            pm25 = (station.get("AQILast") or {}).get("PM25") or {}
+            valid[i] = lats[i] != 0 and lngs[i] != 0 and bool(pm25.get("value"))
 
+        return stations, lats, lngs, valid
+
+    def _build_name_index(self, stations: List[Dict]) -> Tuple[str, List[int], List[Dict]]:
+        """Join searchable names into one lowercased haystack and build each station's lookup result once"""
+        parts = []
+        starts = []
+        records = []
+        offset = 0
+        for station in stations:
+            aqi_data = station.get("AQILast", {})
+            pm25 = aqi_data.get("PM25", {})
+            aqi = aqi_data.get("AQI", {})
+
+            record = {
+                "station_name": station.get("nameTH"),
+                "area": station.get("areaTH"),
+                "pm25": pm25.get("value") if pm25 else None,
+                "aqi": aqi.get("aqi") if aqi else None,
+                "time": f"{aqi_data.get('date')} {aqi_data.get('time')}" if aqi_data.get("date") else None,
+            }
+            # NUL-separated fields, so a match can never span two fields
+            # and the first match belongs to the first matching station
+            part = "\x00".join((
+                (station.get("nameTH") or "").lower(),
+                (station.get("nameEN") or "").lower(),
+                (station.get("areaTH") or "").lower(),
+            )) + "\x00"
+            parts.append(part)
+            starts.append(offset)
+            records.append(record)
+            offset += len(part)
+        return "".join(parts), starts, records
+
+    def _build_bangkok_summary(self, stations: List[Dict]) -> Optional[Dict]:
+        """Compute the Bangkok PM2.5 summary once per station refresh"""
         pm25_values = []
-        station_names = []
 
         for station in stations:
             if station.get("stationID") in BANGKOK_STATIONS:
@@ -77,7 +244,6 @@ class DustService:
                         value = float(pm25["value"])
                         if value > 0:  # Valid reading
                             pm25_values.append(value)
-                            station_names.append(station.get("nameTH", ""))
                     except (ValueError, TypeError):
                         pass
 
@@ -92,6 +258,13 @@ class DustService:
             }
         return None
 
+    async def get_bangkok_average(self) -> Optional[Dict]:
+        """Get average PM2.5 for Bangkok area"""
+        stations = await self.get_all_stations()
+        if not stations or self._bangkok_summary is None:
+            return None
+        return dict(self._bangkok_summary)
+
     async def get_station_by_name(self, query: str) -> Optional[Dict]:
         """Find station by name search"""
         stations = await self.get_all_stations()
@@ -99,74 +272,73 @@ class DustService:
             return None
 
         query_lower = query.lower()
+        if "\x00" in query_lower:
+            return None
 
-        for station in stations:
-            name_th = station.get("nameTH", "").lower()
-            name_en = station.get("nameEN", "").lower()
-            area = station.get("areaTH", "").lower()
-
-            if query_lower in name_th or query_lower in name_en or query_lower in area:
-                aqi_data = station.get("AQILast", {})
-                pm25 = aqi_data.get("PM25", {})
-                aqi = aqi_data.get("AQI", {})
-
-                return {
-                    "station_name": station.get("nameTH"),
-                    "area": station.get("areaTH"),
-                    "pm25": pm25.get("value") if pm25 else None,
-                    "aqi": aqi.get("aqi") if aqi else None,
-                    "time": aqi_data.get("date") + " " + aqi_data.get("time") if aqi_data.get("date") else None,
-                }
-        return None
+        haystack, starts, records = self._name_index
+        pos = haystack.find(query_lower)
+        if pos == -1 or not records:
+            return None
+        return dict(records[bisect.bisect_right(starts, pos) - 1])
 
     async def get_nearest_station(self, lat: float, lng: float) -> Optional[Dict]:
         """Find nearest station by coordinates"""
         stations = await self.get_all_stations()
-        if not stations:
+        if not stations or self._station_arrays is None:
             return None
 
-        nearest_station = None
-        min_distance = float('inf')
-
-        for station in stations:
-            try:
-                station_lat = float(station.get("lat", 0))
-                station_lng = float(station.get("long", 0))
-
-                if station_lat == 0 or station_lng == 0:
-                    continue
-
-                distance = haversine_distance(lat, lng, station_lat, station_lng)
-
-                # Check if station has valid PM2.5 data
-                aqi_data = station.get("AQILast", {})
-                pm25 = aqi_data.get("PM25", {})
-                if not pm25 or not pm25.get("value"):
-                    continue
-
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_station = {
-                        "station_name": station.get("nameTH"),
-                        "area": station.get("areaTH"),
-                        "pm25": pm25.get("value"),
-                        "aqi": aqi_data.get("AQI", {}).get("aqi"),
-                        "time": f"{aqi_data.get('date', '')} {aqi_data.get('time', '')}".strip(),
-                        "distance": round(distance, 1),
-                        "lat": station_lat,
-                        "lng": station_lng,
-                    }
-            except (ValueError, TypeError):
-                continue
+        # Use the arrays' own station list so indexes always line up
+        stations, lats, lngs, valid = self._station_arrays
+        if not valid.any():
+            return None
 
-        return nearest_station
+        if _nearest_nb is not None:
+            i, distance = _nearest_nb(lat, lng, lats, lngs, valid)
+            i, distance = int(i), float(distance)
+        else:
+            i, distance = self._nearest_in_band(lat, lng, lats, lngs, valid)
+        if i is None:
+            # Nothing provably nearest inside the box, compare every station
+            distances = np.where(valid, haversine_distances(lat, lng, lats, lngs), np.inf)
+            i = int(np.argmin(distances))
+            distance = float(distances[i])
+
+        station = stations[i]
+        aqi_data = station.get("AQILast", {})
+        return {
+            "station_name": station.get("nameTH"),
+            "area": station.get("areaTH"),
+            "pm25": aqi_data.get("PM25", {}).get("value"),
+            "aqi": aqi_data.get("AQI", {}).get("aqi"),
+            "time": f"{aqi_data.get('date', '')} {aqi_data.get('time', '')}".strip(),
+            "distance": round(distance, 1),
+            "lat": float(lats[i]),
+            "lng": float(lngs[i]),
+        }
+
+    def _nearest_in_band(
+        self, lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray, valid: np.ndarray
+    ) -> Tuple[Optional[int], float]:
+        """Nearest valid station inside a lat/lng box around the point, if it beats everything outside"""
+        band = NEAREST_SEARCH_BAND
+        candidates = np.flatnonzero(valid & (np.abs(lats - lat) <= band) & (np.abs(lngs - lng) <= band))
+        if candidates.size == 0:
+            return None, 0.0
+
+        distances = haversine_distances(lat, lng, lats[candidates], lngs[candidates])
+        j = int(np.argmin(distances))
+
+        # Any station outside the box is at least this far away (distance to
+        # the box's nearest meridian edge, which is closer than its lat edges)
+        outside_km = 6371 * math.asin(math.cos(math.radians(lat)) * math.sin(math.radians(band)))
+        if distances[j] >= outside_km:
+            return None, 0.0
+        return int(candidates[j]), float(distances[j])
 
     def get_aqi_level(self, pm25: float) -> Dict:
         """Get AQI level info based on PM2.5 value"""
-        for level in AQI_LEVELS:
-            if pm25 <= level["max"]:
-                return level
-        return AQI_LEVELS[-1]
+        i = bisect.bisect_left(_AQI_MAXES, pm25)
+        return AQI_LEVELS[min(i, len(AQI_LEVELS) - 1)]
 
     async def get_dust_report(self, location: Optional[str] = None) -> str:
         """Get formatted dust report"""
@@ -8,6 +8,31 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Shared options for broadcast jobs: collapse missed runs into one, never
+# overlap broadcasts, and still run if the process wakes up late
+BROADCAST_JOB_OPTIONS = {
+    "replace_existing": True,
+    "coalesce": True,
+    "max_instances": 1,
+    "misfire_grace_time": 300,
+}
+
+
+async def _run_pm25_broadcast():
+    """Scheduled job: broadcast the PM2.5 report"""
+    from services.broadcast_service import get_broadcast_service
+
+    logger.info("Running scheduled PM2.5 broadcast...")
+    try:
+        service = get_broadcast_service()
+        success = await service.broadcast_pm25_report()
+        if success:
+            logger.info("Scheduled PM2.5 broadcast completed successfully")
+        else:
+            logger.error("Scheduled PM2.5 broadcast failed")
+    except Exception as e:
+        logger.error(f"Error in scheduled broadcast: {e}")
+
 
 class SchedulerService:
     """Service for scheduling periodic tasks"""
@@ -38,26 +63,12 @@ class SchedulerService:
             hour: Hour to send (0-23), default 7 AM
             minute: Minute to send (0-59), default 0
         """
-        from services.broadcast_service import get_broadcast_service
-
-        async def broadcast_job():
-            logger.info("Running scheduled PM2.5 broadcast...")
-            try:
-                service = get_broadcast_service()
-                success = await service.broadcast_pm25_report()
-                if success:
-                    logger.info("Scheduled PM2.5 broadcast completed successfully")
-                else:
-                    logger.error("Scheduled PM2.5 broadcast failed")
-            except Exception as e:
-                logger.error(f"Error in scheduled broadcast: {e}")
-
         # Schedule for specified time, Bangkok timezone (Asia/Bangkok)
         self.scheduler.add_job(
-            broadcast_job,
+            _run_pm25_broadcast,
             CronTrigger(hour=hour, minute=minute, timezone="Asia/Bangkok"),
             id="pm25_broadcast",
-            replace_existing=True
+            **BROADCAST_JOB_OPTIONS
         )
         logger.info(f"PM2.5 broadcast scheduled for {hour:02d}:{minute:02d} daily (Bangkok time)")
 
@@ -68,26 +79,12 @@ class SchedulerService:
         Args:
             times: List of (hour, minute) tuples, e.g. [(7, 0), (12, 0), (18, 0)]
         """
-        from services.broadcast_service import get_broadcast_service
-
-        async def broadcast_job():
-            logger.info("Running scheduled PM2.5 broadcast...")
-            try:
-                service = get_broadcast_service()
-                success = await service.broadcast_pm25_report()
-                if success:
-                    logger.info("Scheduled PM2.5 broadcast completed successfully")
-                else:
-                    logger.error("Scheduled PM2.5 broadcast failed")
-            except Exception as e:
-                logger.error(f"Error in scheduled broadcast: {e}")
-
         for i, (hour, minute) in enumerate(times):
             self.scheduler.add_job(
-                broadcast_job,
+                _run_pm25_broadcast,
                 CronTrigger(hour=hour, minute=minute, timezone="Asia/Bangkok"),
                 id=f"pm25_broadcast_{i}",
-                replace_existing=True
+                **BROADCAST_JOB_OPTIONS
             )
             logger.info(f"PM2.5 broadcast scheduled for {hour:02d}:{minute:02d} (Bangkok time)")
 
@@ -1,11 +1,16 @@
 """User state management for conversation flow"""
 
-import json
+import logging
 import os
+import sqlite3
+import orjson
+from collections import OrderedDict
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 
 class ConversationState(str, Enum):
     """States in the conversation flow"""
@@ -18,6 +23,15 @@ class ConversationState(str, Enum):
 
 class UserSession:
     """User session data"""
+    __slots__ = (
+        "user_id",
+        "state",
+        "current_question_index",
+        "answers",
+        "total_score",
+        "last_activity",
+    )
+
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.state = ConversationState.IDLE
@@ -56,66 +70,165 @@ class UserSession:
 
 
 class StateManager:
-    """Manages user conversation states with file persistence"""
+    """Manages user conversation states with SQLite persistence"""
 
-    STATE_FILE = "user_states.json"
+    STATE_DB = "user_states.db"
+    LEGACY_STATE_FILE = "user_states.json"
     SESSION_TIMEOUT_HOURS = 24
+    # Recently used sessions kept in memory; the rest are read back from disk
+    MAX_CACHED_SESSIONS = 1024
 
     def __init__(self):
-        self._sessions: Dict[str, UserSession] = {}
-        self._load_states()
+        # Least recently used first, bounded by MAX_CACHED_SESSIONS
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._db = sqlite3.connect(self.STATE_DB, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                user_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                current_question_index INTEGER NOT NULL,
+                answers TEXT NOT NULL,
+                total_score INTEGER NOT NULL,
+                last_activity TEXT NOT NULL
+            )"""
+        )
+        self._import_legacy_file()
+        # isoformat() strings compare in time order, no datetime parsing needed
+        self._db.execute("DELETE FROM sessions WHERE last_activity < ?", (self._expiry_cutoff(),))
+
+    def close(self):
+        """Close the database connection"""
+        self._db.close()
+
+    def _expiry_cutoff(self) -> str:
+        """ISO timestamp before which a session counts as expired"""
+        return (datetime.now() - timedelta(hours=self.SESSION_TIMEOUT_HOURS)).isoformat()
+
+    def _import_legacy_file(self):
+        """Move sessions from the old JSON state file into the database once"""
+        if not os.path.exists(self.LEGACY_STATE_FILE):
+            return
+        try:
+            with open(self.LEGACY_STATE_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            logger.exception("Error reading legacy states")
+            return
 
-    def _load_states(self):
-        """Load states from file"""
-        if os.path.exists(self.STATE_FILE):
+        for user_id, session_data in (data.items() if isinstance(data, dict) else ()):
             try:
-                with open(self.STATE_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for user_id, session_data in data.items():
-                        session = UserSession.from_dict(session_data)
-                        # Check if session expired
-                        if datetime.now() - session.last_activity < timedelta(hours=self.SESSION_TIMEOUT_HOURS):
-                            self._sessions[user_id] = session
-            except Exception as e:
-                print(f"Error loading states: {e}")
-                self._sessions = {}
-
-    def _save_states(self):
-        """Save states to file"""
+                # Never overwrite a row the database already has; it is newer
+                # than anything in the legacy file
+                self._db.execute(
+                    "INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                    self._session_row(UserSession.from_dict(session_data)),
+                )
+            except (KeyError, TypeError, ValueError, sqlite3.Error):
+                logger.exception("Skipping bad legacy state for %.8s...", user_id)
+
+        try:
+            os.replace(self.LEGACY_STATE_FILE, self.LEGACY_STATE_FILE + ".migrated")
+        except OSError:
+            logger.exception("Error renaming legacy state file")
+
+    @staticmethod
+    def _session_row(session: UserSession) -> tuple:
+        """Column values for one session row"""
+        return (
+            session.user_id,
+            session.state.value,
+            session.current_question_index,
+            orjson.dumps(session.answers).decode(),
+            session.total_score,
+            session.last_activity.isoformat(),
+        )
+
+    def _save_session(self, session: UserSession):
+        """Upsert one session row"""
+        row = self._session_row(session)
         try:
-            data = {user_id: session.to_dict() for user_id, session in self._sessions.items()}
-            with open(self.STATE_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving states: {e}")
+            self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)", row)
+        except sqlite3.Error:
+            logger.exception("Error saving state")
+
+    def _load_session(self, user_id: str) -> Optional[UserSession]:
+        """Read one unexpired session row, if any"""
+        try:
+            row = self._db.execute(
+                "SELECT state, current_question_index, answers, total_score, last_activity"
+                " FROM sessions WHERE user_id = ? AND last_activity >= ?",
+                (user_id, self._expiry_cutoff()),
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception("Error loading state")
+            return None
+        if row is None:
+            return None
+
+        state, question_index, answers, total_score, last_activity = row
+        return UserSession.from_dict({
+            "user_id": user_id,
+            "state": state,
+            "current_question_index": question_index,
+            "answers": orjson.loads(answers),
+            "total_score": total_score,
+            "last_activity": last_activity,
+        })
+
+    def _remember(self, session: UserSession):
+        """Keep a session in memory as most recently used, evicting the oldest"""
+        self._sessions[session.user_id] = session
+        self._sessions.move_to_end(session.user_id)
+        while len(self._sessions) > self.MAX_CACHED_SESSIONS:
+            # Every change is already saved, so dropping an entry loses nothing
+            self._sessions.popitem(last=False)
+
+    def _get_loaded_session(self, user_id: str) -> Optional[UserSession]:
+        """Get a session from memory, loading it from the database if needed"""
+        session = self._sessions.get(user_id)
+        if session is not None and session.last_activity.isoformat() < self._expiry_cutoff():
+            # Expired while cached; treat it like the database does
+            del self._sessions[user_id]
+            session = None
+        if session is None:
+            session = self._load_session(user_id)
+        if session is not None:
+            self._remember(session)
+        return session
 
     def get_session(self, user_id: str) -> UserSession:
         """Get or create user session"""
-        if user_id not in self._sessions:
-            self._sessions[user_id] = UserSession(user_id)
-            self._save_states()
+        session = self._get_loaded_session(user_id)
+        if session is None:
+            session = UserSession(user_id)
+            self._remember(session)
+            self._save_session(session)
 
-        session = self._sessions[user_id]
         session.last_activity = datetime.now()
         return session
 
     def update_session(self, session: UserSession):
         """Update and save session"""
         session.last_activity = datetime.now()
-        self._sessions[session.user_id] = session
-        self._save_states()
+        self._remember(session)
+        self._save_session(session)
 
     def reset_session(self, user_id: str):
         """Reset user session"""
-        if user_id in self._sessions:
-            self._sessions[user_id].reset()
-            self._save_states()
+        session = self._get_loaded_session(user_id)
+        if session is not None:
+            session.reset()
+            self._save_session(session)
 
     def add_answer(self, user_id: str, question_id: str, score: int):
         """Record an answer and update score"""
         session = self.get_session(user_id)
+        # Answers are only added or overwritten, so adjust the total by the delta
+        previous = session.answers.get(question_id, 0)
         session.answers[question_id] = score
-        session.total_score = sum(session.answers.values())
+        session.total_score += score - previous
         self.update_session(session)
 
 